@@ -4,7 +4,7 @@ Reference: Example 5.2.2 in the thesis.
 '''
 
 from src import qasp
-from src.examples.util import tab, pause
+from src.examples.util import draw, tab, pause
 
 # ASP program
 PRGM = '''
@@ -50,19 +50,19 @@ def main():
 
     # Initialization algorithm
     algorithm = qasp.init_algorithm.alg_from_weights(WEIGHTS)  # Rot gate
-    print(f'Initialization algorithm:\n{tab(str(algorithm.draw()))}\n')
+    print(f'Initialization algorithm:\n{tab(draw(algorithm))}\n')
     pause()
 
     # Oracle
     oracle = qasp.oracle.from_asp_stable_models(
         STABLE_MODELS, var_order=['p', 'q', 'r'])
-    print(f'Quantum oracle:\n{tab(str(oracle[1].draw()))}\n')
+    print(f'Quantum oracle:\n{tab(draw(oracle[1]))}\n')
     pause()
 
     # Simulation
     (circuit, iters, stable_model) = qasp.problems.amplification.exec_find_one_known_m(
         algorithm, oracle, M)
-    print(f'Used circuit:\n{tab(str(circuit.draw()))}\n')
+    print(f'Used circuit:\n{tab(draw(circuit))}\n')
     pause()
     print(f'Found stable model: {stable_model}.')
     print(f'Number of iterations: {iters}.')
@@ -5,7 +5,7 @@ Reference: Example 5.2.1 in the thesis.
 '''
 
 from src import qasp
-from src.examples.util import tab, pause
+from src.examples.util import draw, tab, pause
 
 # ASP program
 PRGM = '''
@@ -36,21 +36,20 @@ def main():
 
     # Initialization algorithm
     algorithm = qasp.init_algorithm.alg_grover(n)  # Walsh-Hadamard
-    print(f'Initialization algorithm:\n{tab(str(algorithm.draw()))}\n')
+    print(f'Initialization algorithm:\n{tab(draw(algorithm))}\n')
     pause()
 
     # Oracle
     oracle = qasp.oracle.from_asp_stable_models(
         STABLE_MODELS, var_order=['p', 'q', 'r'])
-    print(f'Quantum oracle:\n{tab(str(oracle[1].draw()))}\n')
+    print(f'Quantum oracle:\n{tab(draw(oracle[1]))}\n')
     pause()
 
     # Simulation
     (circuits, iters, stable_model) = qasp.problems.amplification.exec_find_one_unknown_m(
         algorithm, oracle)
-    print('All used circuits:')
-    for circuit in circuits:
-        print(f'{tab(str(circuit.draw()))}\n')
+    drawings = '\n\n'.join(tab(draw(circuit)) for circuit in circuits)
+    print(f'All simulated circuits:\n{drawings}\n')
     pause()
     print(f'Found stable model: {stable_model}.')
     print(f'Number of iterations: {iters}.')
@@ -3,10 +3,9 @@
 Reference: Example 4.2.1 in the thesis.
 '''
 
-import copy
 from qiskit import QuantumCircuit, QuantumRegister
 from src import qasp
-from src.examples.util import tab, pause
+from src.examples.util import draw, tab, pause
 
 # ASP program
 PRGM = '''
@@ -59,7 +58,7 @@ def build_oracle() -> tuple[qasp.oracle.Oracle, list[int]]:
     q_oracle.ccx(q, q_in_reduct, q_equal, ctrl_state='00')
     q_oracle.barrier()
 
-    undo = copy.deepcopy(q_oracle).reverse_ops()
+    undo = q_oracle.inverse()  # Steps 1-3 only use self-inverse gates
 
     # Step 4
     q_oracle.x(equal)
@@ -96,18 +95,18 @@ def main():
     reg_aux = QuantumRegister(n_aux, 'aux')
     algorithm.add_register(reg_aux)
     algorithm.name += ' x Id'
-    print(f'Initialization algorithm:\n{tab(str(algorithm.draw()))}\n')
+    print(f'Initialization algorithm:\n{tab(draw(algorithm))}\n')
     pause()
 
     # Oracle
     (oracle, aux_qubits) = build_oracle()
-    print(f'Quantum oracle:\n{tab(str(oracle[1].draw()))}\n')
+    print(f'Quantum oracle:\n{tab(draw(oracle[1]))}\n')
     pause()
 
     # Simulation
     (circuit, iters, stable_model) = qasp.problems.amplification.exec_find_one_known_m(
         algorithm, oracle, M, aux_qubits)
-    print(f'Used circuit:\n{tab(str(circuit.draw()))}\n')
+    print(f'Used circuit:\n{tab(draw(circuit))}\n')
     pause()
     print(f'Found stable model: {stable_model}.')
     print(f'Number of iterations: {iters}.')
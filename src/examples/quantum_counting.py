@@ -5,7 +5,7 @@ Reference: Example 4.1.2 in the thesis.
 
 import math
 from src import qasp
-from src.examples.util import tab, pause
+from src.examples.util import draw, tab, pause
 
 # ASP program
 PRGM = '''
@@ -36,13 +36,13 @@ def main():
 
     # Initialization algorithm
     algorithm = qasp.init_algorithm.alg_grover(n)  # Walsh-Hadamard
-    print(f'Initialization algorithm:\n{tab(str(algorithm.draw()))}\n')
+    print(f'Initialization algorithm:\n{tab(draw(algorithm))}\n')
     pause()
 
     # Oracle
     oracle = qasp.oracle.from_asp_stable_models(
         STABLE_MODELS, var_order=['p', 'q', 'r'])
-    print(f'Quantum oracle:\n{tab(str(oracle[1].draw()))}\n')
+    print(f'Quantum oracle:\n{tab(draw(oracle[1]))}\n')
     pause()
 
     # Simulation
@@ -50,7 +50,7 @@ def main():
     eps = 1/6
     # pylint: disable=invalid-name
     (circuit, _, M) = qasp.problems.estimation.exec_count(algorithm, oracle, m, eps)
-    print(f'Used circuit:\n{tab(str(circuit.draw()))}\n')
+    print(f'Used circuit:\n{tab(draw(circuit))}\n')
     pause()
     print(
         'Estimated number of solutions:',
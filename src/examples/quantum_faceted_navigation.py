@@ -5,7 +5,7 @@ Reference: Example 5.1.1 in the thesis.
 
 import math
 from src import qasp
-from src.examples.util import tab, pause
+from src.examples.util import draw, tab, pause
 
 # ASP program
 PRGM = '''
@@ -63,13 +63,13 @@ def main():
 
     # Initialization algorithm
     algorithm = qasp.init_algorithm.alg_from_weights(WEIGHTS)  # Rot gate
-    print(f'Initialization algorithm:\n{tab(str(algorithm.draw()))}\n')
+    print(f'Initialization algorithm:\n{tab(draw(algorithm))}\n')
     pause()
 
     # Oracle
     oracle = qasp.oracle.from_asp_stable_models(
         STABLE_MODELS, var_order=['p', 'q', 'r'])
-    print(f'Quantum oracle:\n{tab(str(oracle[1].draw()))}\n')
+    print(f'Quantum oracle:\n{tab(draw(oracle[1]))}\n')
     pause()
 
     # Simulation
@@ -78,7 +78,7 @@ def main():
     # pylint: disable=invalid-name
     (circuit, _, M) = qasp.problems.estimation.exec_count(
         algorithm, oracle, m, eps, count_fn=count_fn)
-    print(f'Used circuit:\n{tab(str(circuit.draw()))}\n')
+    print(f'Used circuit:\n{tab(draw(circuit))}\n')
     pause()
     print(
         'Estimated number of solutions:',
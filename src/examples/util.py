@@ -1,6 +1,13 @@
 '''Dummy example that exports some utility functions to be used by otehr examples.
 '''
 
+import os
+import textwrap
+from qiskit import QuantumCircuit
+
+# Whether circuits should be rendered (set `QASP_DRAW=0' to skip it, e.g. for benchmarks)
+DRAW = os.environ.get('QASP_DRAW', '1') == '1'
+
 
 def pause():
     '''Pause the program execution and wait for the user to press a key to continue.
@@ -9,6 +16,18 @@ def pause():
     print()
 
 
+def draw(circ: QuantumCircuit) -> str:
+    '''Render a circuit as text, unless drawing is disabled.
+
+    #### Arguments
+        circ (QuantumCircuit): Circuit to be drawn.
+
+    #### Return
+        str: Text drawing of the circuit, or a placeholder if drawing is disabled.
+    '''
+    return str(circ.draw()) if DRAW else '<circuit suppressed>'
+
+
 def tab(lines: str, striplines: bool = False) -> str:
     '''Return a variant of the input string indented by one level.
 
@@ -19,10 +38,9 @@ def tab(lines: str, striplines: bool = False) -> str:
     #### Return
         str: Indented variant of the provided string.
     '''
-    return '\n'.join([
-        '    ' + (line.strip() if striplines else line)
-        for line in lines.splitlines(False)
-    ])
+    if striplines:
+        lines = '\n'.join(line.strip() for line in lines.splitlines(False))
+    return textwrap.indent(lines, '    ', lambda _: True)
 
 
 if __name__ == '__main__':
@@ -1,4 +1,4 @@
 '''The QASP library.
 '''
 
-from . import init_algorithm, oracle, problems, simul
+from . import decompose, init_algorithm, oracle, problems, simul
@@ -0,0 +1,88 @@
+'''Utility functions for decomposing quantum circuits into discrete gate sets.
+'''
+
+import functools
+from qiskit import QuantumCircuit, transpile
+from qiskit.circuit import Gate
+from qiskit.converters import circuit_to_dag, dag_to_circuit
+from qiskit.synthesis import generate_basic_approximations
+from qiskit.transpiler.passes.synthesis import SolovayKitaev
+
+
+# +---------------+
+# | Decomposition |
+# +---------------+
+
+@functools.lru_cache(maxsize=None)
+def __basic_approximations(approx_depth: int) -> list:
+    '''Generate (once per depth) the basic approximations of the Clifford+T basis.
+
+    #### Arguments
+        approx_depth (int): Gates approximation depth.
+
+    #### Return
+        list: Basic approximations.
+    '''
+    clifford_t_basis = ['h', 's', 't']
+    return generate_basic_approximations(clifford_t_basis, depth=approx_depth)
+
+
+@functools.lru_cache(maxsize=None)
+def __solovay_kitaev(approx_depth: int, sk_rec: int) -> SolovayKitaev:
+    '''Return the (shared) Solovay-Kitaev decomposition pass for the given parameters.
+
+    #### Arguments
+        approx_depth (int): Gates approximation depth.
+        sk_rec (int): Recursion degree for the Solovay-Kitaev decomposition algorithm.
+
+    #### Return
+        SolovayKitaev: Decomposition pass.
+    '''
+    basis = __basic_approximations(approx_depth)
+    return SolovayKitaev(recursion_degree=sk_rec, basic_approximations=basis)
+
+
+def transpile_into_clifford_t_basis(
+    circ: QuantumCircuit,
+    approx_depth: int = 3,
+    sk_rec: int = 2,
+    opt_lv: int = 3,
+) -> QuantumCircuit:
+    '''Transpile and decompose a given circuit into the Clifford+T basis.
+
+    #### Arguments
+        circ (QuantumCircuit): Quantum circuit to be transpiled.
+        approx_depth (int): Gates approximation depth. Defaults to 3.
+        sk_rec (int): Recursion degree for the Solovay-Kitaev decomposition algorithm. Defaults to
+            2.
+        opt_lv (int): Optimization level for the transpiling process. Defaults to 3.
+
+    #### Return
+        QuantumCircuit: Transpiled circuit.
+    '''
+    universal_basis = ['u1', 'u2', 'u3', 'cx']
+    skd = __solovay_kitaev(approx_depth, sk_rec)
+    transpiled = transpile(
+        circ, basis_gates=universal_basis, optimization_level=opt_lv)
+
+    # Decompose each distinct single-qubit gate only once
+    # NOTE: Circuits such as the estimation ones contain many copies of the same gates (e.g. \
+    #       coming from repeated Grover iterates), each of which would otherwise be approximated \
+    #       from scratch.
+    dag = circuit_to_dag(transpiled)
+    decompositions = {}
+    for node in dag.op_nodes():
+        if node.op.num_qubits != 1 or not isinstance(node.op, Gate):
+            continue  # E.g. CNOTs, measurements
+        key = (node.op.name, tuple(node.op.params))
+        if key not in decompositions:
+            # The classical condition (if any) is left out, and propagated to the gates of the \
+            # decomposition upon substitution
+            op = node.op.to_mutable()
+            op.condition = None
+            single = QuantumCircuit(1)
+            single.append(op, [0])
+            decompositions[key] = circuit_to_dag(skd(single))
+        dag.substitute_node_with_dag(node, decompositions[key])
+
+    return dag_to_circuit(dag)
@@ -1,18 +1,24 @@
 '''Initialization algorithms for amplitude-related problems.
 '''
 
-import math
+import functools
+import numpy as np
 from qiskit import QuantumCircuit
 
 
-def alg_grover(n: int) -> QuantumCircuit:
-    '''Return an instance of the Grover initialization algorithm.
+# +-----------+
+# | Templates |
+# +-----------+
+
+@functools.lru_cache(maxsize=None)
+def __grover_template(n: int) -> QuantumCircuit:
+    '''Build (once per size) the template of the Grover initialization algorithm.
 
     #### Arguments
         n (int): Number of search qubits.
 
     #### Return
-        QuantumCircuit: Built circuit.
+        QuantumCircuit: Cached circuit. Must not be mutated.
     '''
     circ = QuantumCircuit(n)
     circ.name = 'WH'
@@ -20,22 +26,53 @@ def alg_grover(n: int) -> QuantumCircuit:
     return circ
 
 
-def alg_from_weights(weights: list[float]) -> QuantumCircuit:
-    '''Return an instance of the Rot initialization algorithm defined by Riguzzi and Mykhailova.
+@functools.lru_cache(maxsize=None)
+def __from_weights_template(weights: tuple[float, ...]) -> QuantumCircuit:
+    '''Build (once per weight vector) the template of the Rot initialization algorithm.
 
     #### Arguments
-        weights(list[float]): Weight of each bit evaluating to 1. Complementary is computed \
-            assuming normalization constraint.
+        weights (tuple[float, ...]): Weight of each bit evaluating to 1.
 
     #### Return
-        QuantumCircuit: Built circuit.
+        QuantumCircuit: Cached circuit. Must not be mutated.
     '''
     n = len(weights)
     circ = QuantumCircuit(n)
     circ.name = 'Rot'
 
-    for (i, weight) in zip(range(n), weights):
-        theta = 2 * math.acos(math.sqrt(1 - weight))
+    thetas = 2 * np.arccos(np.sqrt(1 - np.asarray(weights, dtype=np.float64)))
+    for (i, theta) in enumerate(thetas.tolist()):
         circ.ry(theta, i)
 
     return circ
+
+
+# +-------------------------+
+# | Initialization circuits |
+# +-------------------------+
+
+def alg_grover(n: int) -> QuantumCircuit:
+    '''Return an instance of the Grover initialization algorithm.
+
+    #### Arguments
+        n (int): Number of search qubits.
+
+    #### Return
+        QuantumCircuit: Built circuit.
+    '''
+    # Callers are free to mutate the returned circuit, hence the copy of the cached template
+    return __grover_template(n).copy()
+
+
+def alg_from_weights(weights: list[float]) -> QuantumCircuit:
+    '''Return an instance of the Rot initialization algorithm defined by Riguzzi and Mykhailova.
+
+    #### Arguments
+        weights(list[float]): Weight of each bit evaluating to 1. Complementary is computed \
+            assuming normalization constraint.
+
+    #### Return
+        QuantumCircuit: Built circuit.
+    '''
+    # Callers are free to mutate the returned circuit, hence the copy of the cached template
+    return __from_weights_template(tuple(weights)).copy()
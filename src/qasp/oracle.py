@@ -2,8 +2,9 @@
 '''
 
 from typing import Callable
+import numpy as np
 from qiskit.circuit import QuantumCircuit, QuantumRegister
-from qiskit.circuit.library import PhaseOracle
+from qiskit.circuit.library import DiagonalGate
 
 
 # +-------+
@@ -15,36 +16,52 @@ Interpretation = set[Literal]  # Complete (!) set of literals
 ClassicalOracle = Callable[[Interpretation], bool]
 QuantumOracle = QuantumCircuit
 Oracle = tuple[ClassicalOracle, QuantumOracle]
+ModelInt = int  # Bitmask encoding of a model (bit `i' iff atom `i' is true)
+CompiledModels = tuple[list[str], np.ndarray]  # Atoms order and encodings
 
 
 # +-----------------+
-# | Formulas syntax |
+# | Models encoding |
 # +-----------------+
 
-def __literal_to_formula(literal: Literal) -> str:
-    '''Build a logical formula whose only model is the given literal.
+def __model_to_index(model: Interpretation, bits: dict[str, int]) -> ModelInt:
+    '''Compute the bitmask encoding of a model, i.e. the index of the corresponding basis state.
 
     #### Arguments
-        literal (Literal): Input literal.
+        model (Interpretation): Input model.
+        bits (dict[str, int]): Mask of the bit associated to each atom.
 
     #### Returns
-        str: Built logical formula.
+        ModelInt: Encoded model.
     '''
-    (atom, value) = literal
-    return ('' if value else '~') + f'{atom}'
+    return sum(bits[atom] for (atom, value) in model if value)
 
 
-def __model_to_formula(model: Interpretation) -> str:
-    '''Build a logical formula whose only model is the given one.
+def compile_models(
+    stable_models: list[Interpretation],
+    var_order: list[str] = None
+) -> CompiledModels:
+    '''Encode a list of models as indices of basis states, so that it can be reused to build \
+        multiple oracles.
 
     #### Arguments
-        model (Interpretation): Input model.
+        stable_models (list[Interpretation]): List of the stable models of the considered ASP \
+            program.
+        var_order (list[str], optional): Explicit ordering of the variables. Defaults to `None` \
+            (i.e. appearence order).
 
     #### Returns
-        str: Built logical formula.
+        CompiledModels: Ordered atoms and array of basis state indices.
     '''
-    pieces = map(__literal_to_formula, model)
-    return '(' + ' & '.join(pieces) + ')'
+    atoms = [
+        atom for (atom, _) in stable_models[0]
+    ] if var_order is None else list(var_order)
+    bits = {atom: 1 << i for (i, atom) in enumerate(atoms)}
+    indices = np.array(
+        [__model_to_index(model, bits) for model in stable_models],
+        dtype=np.uint64
+    )
+    return (atoms, indices)
 
 
 # +---------------------+
@@ -52,36 +69,41 @@ def __model_to_formula(model: Interpretation) -> str:
 # +---------------------+
 
 def from_asp_stable_models(
-    stable_models: list[Interpretation],
+    stable_models: list[Interpretation] | CompiledModels,
     var_order: list[str] = None
 ) -> Oracle:
     '''Build an oracle solving an ASP program.
 
     #### Arguments
-        stable_models (list[Interpretation]): List of the stable models of the considered ASP \
-            program.
+        stable_models (list[Interpretation] | CompiledModels): List of the stable models of the \
+            considered ASP program, possibly already encoded by `compile_models`.
         var_order (list[str], optional): Explicit ordering of the variables. Defaults to `None` \
-            (i.e. appearence order).
+            (i.e. appearence order). Ignored if the stable models are already encoded.
 
     #### Returns
         Oracle: Built oracle.
     '''
-    atoms = [
-        atom for (atom, _) in stable_models[0]
-    ] if var_order is None else var_order
+    (atoms, indices) = stable_models if isinstance(
+        stable_models, tuple) else compile_models(stable_models, var_order)
+    bits = {atom: 1 << i for (i, atom) in enumerate(atoms)}
 
     # Build classical oracle
+    # NOTE: Models are only compared through their bitmask encoding, i.e. each check costs one \
+    #       pass over the interpretation and a single integer hash, instead of hashing literals.
+    indices_set: frozenset[ModelInt] = frozenset(indices.tolist())
+
     def c_oracle(interp):
-        return interp in stable_models
+        return __model_to_index(interp, bits) in indices_set
 
     # Build quantum oracle
-    clauses = map(__model_to_formula, stable_models)
-    formula = ' | '.join(clauses)
-    oracle_gate = PhaseOracle(formula, var_order=atoms)
+    # NOTE: The stable models are known explicitly, hence we can directly build the diagonal \
+    #       unitary flipping their phase, without synthesizing a boolean formula.
+    diag = np.ones(2**len(atoms), dtype=complex)
+    diag[indices] = -1
 
     # Wrap quantum oracle in a circuit with proper qubit labels
     regs = [QuantumRegister(1, f'{atom}') for atom in atoms]
     q_oracle = QuantumCircuit(*regs, name='Oracle')
-    q_oracle.compose(oracle_gate, q_oracle.qubits, inplace=True)
+    q_oracle.append(DiagonalGate(list(diag)), q_oracle.qubits)
 
     return (c_oracle, q_oracle)
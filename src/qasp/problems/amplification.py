@@ -1,19 +1,30 @@
 '''Amplitude amplification algorithms.
 '''
 
-import copy
+import functools
+import logging
 import math
 import random
-from qiskit import ClassicalRegister, QuantumCircuit, QuantumRegister
-from qiskit.circuit.library import GroverOperator
+import numpy as np
+from qiskit import ClassicalRegister, QuantumCircuit, QuantumRegister, transpile
+from qiskit.circuit import Instruction
+from qiskit.circuit.library import DiagonalGate, GroverOperator
+from qiskit_aer.library import SaveProbabilities
 from ..oracle import Interpretation, QuantumOracle, Oracle
-from ..simul import exec_circuit
+from ..simul import compile_circuit, exec_compiled
+
+
+__logger = logging.getLogger(__name__)
+
+# Maximum number of unknown-m search rounds whose outcome distributions are simulated together
+MAX_ROUNDS_PER_SIMULATION = 8
 
 
 # +-----------------------+
 # | Amplification circuit |
 # +-----------------------+
 
+@functools.lru_cache(maxsize=None)
 def __optimal_num_iters(n: int, m: int) -> int:
     '''Return the optimal number of iterations for amplitude amplification.
     Source: \
@@ -26,10 +37,137 @@ def __optimal_num_iters(n: int, m: int) -> int:
     #### Return
         int: Optimal number of iterations.
     '''
+    # Closed forms for the edge cases (also avoids a division by zero for m = 0)
+    # NOTE: With at least half of the states being solutions, plain sampling is already good \
+    #       enough, hence the search register never needs to be augmented.
+    if m <= 0 or 2 * m >= 2**n:
+        return 0
+    if 4 * m >= 2**n:  # Rotation angle of at least pi/6
+        return 1
+
     amplitude = math.sqrt(m / 2**n)
     return round(math.acos(amplitude) / (2 * math.asin(amplitude)))
 
 
+def augment(
+    algorithm: QuantumCircuit,
+    oracle: QuantumOracle
+) -> tuple[QuantumCircuit, QuantumOracle]:
+    '''Add one more search qubit (in equiprobable superposition) to the algorithm and oracle, in \
+        order to halve the fraction of solutions.
+
+    #### Arguments
+        algorithm (QuantumCircuit): Circuit that implements the initialization algorithm.
+        oracle (QuantumOracle): Circuit that implements the oracle.
+
+    #### Returns
+        tuple[QuantumCircuit, QuantumOracle]: Augmented algorithm and oracle.
+    '''
+    # NOTE: Augmented variants are built as new circuits (sharing the original registers), so \
+    #       that the given ones are never mutated and do not need to be copied by callers.
+    n_all = algorithm.num_qubits + 1
+    aug = QuantumRegister(1, 'aug')
+
+    # Algorithm
+    algorithm_aug = QuantumCircuit(*algorithm.qregs, aug, name='AlgorithmAug')
+    algorithm_aug.compose(algorithm, list(range(n_all-1)), inplace=True)
+    algorithm_aug.h(aug)  # Equiprobable superposition
+    assert algorithm_aug.num_qubits == n_all
+
+    # Oracle
+    c_oracle = oracle.control()
+    c_oracle.name = 'OracleAug'
+    oracle_aug = QuantumCircuit(*oracle.qregs, aug, name=oracle.name)
+    oracle_aug.compose(
+        c_oracle,
+        [n_all-1, *range(n_all-1)],
+        inplace=True,
+    )
+    assert oracle_aug.num_qubits == n_all
+
+    return (algorithm_aug, oracle_aug)
+
+
+def zero_reflection(num_qubits: int, reflection_qubits: list[int]) -> QuantumCircuit:
+    '''Build the reflection about the all-zero state of the given qubits (i.e. I - 2|0><0|), \
+        to be used as the zero reflection of a Grover operator.
+
+    #### Arguments
+        num_qubits (int): Total number of qubits.
+        reflection_qubits (list[int]): List of indices of the qubits to reflect about.
+
+    #### Return
+        QuantumCircuit: Built circuit.
+    '''
+    # NOTE: The reflection is applied directly as a diagonal, instead of being synthesized as a \
+    #       multi-controlled gate surrounded by X gates.
+    diag = np.ones(2**len(reflection_qubits), dtype=complex)
+    diag[0] = -1
+    circ = QuantumCircuit(num_qubits, name='S_0')
+    circ.append(DiagonalGate(list(diag)), reflection_qubits)
+    return circ
+
+
+def __grover_iterate(
+    algorithm: QuantumCircuit,
+    oracle: QuantumOracle,
+    reflection_qubits: list[int]
+) -> Instruction:
+    '''Build the Grover iterate (i.e. oracle followed by diffusion) as a single optimized \
+        instruction, so that it can be cheaply repeated.
+
+    #### Arguments
+        algorithm (QuantumCircuit): Circuit that implements the initialization algorithm.
+        oracle (QuantumOracle): Circuit that implements the oracle.
+        reflection_qubits (list[int]): List of indices of the qubits to reflect about.
+
+    #### Returns
+        Instruction: Built instruction.
+    '''
+    s_0 = zero_reflection(algorithm.num_qubits, reflection_qubits)
+    op = GroverOperator(
+        oracle,
+        state_preparation=algorithm,
+        zero_reflection=s_0,
+        reflection_qubits=reflection_qubits,
+    ).decompose()
+    op = transpile(op, optimization_level=3)  # Optimized only once
+    op.name = 'Q'
+    return op.to_instruction()
+
+
+def grover_iterate(
+    algorithm: QuantumCircuit,
+    oracle: QuantumOracle,
+    inc: bool = False,
+    aux_qubits: list[int] = None
+) -> Instruction:
+    '''Build the Grover iterate used by `circuit` when called with the same arguments, so that \
+        it can be synthesized once and shared by multiple circuits.
+
+    #### Arguments
+        algorithm (QuantumCircuit): Circuit that implements the initialization algorithm.
+        oracle (QuantumOracle): Circuit that implements the oracle.
+        inc (bool): Whether to use an additional qubit for searching (necessary if m > n/2). \
+            Defaults to False.
+        aux_qubits (list[int]): List of indices of auxiliary qubits (e.g. used by the oracle) \
+            that should not be used for the search procedure. Defaults to the empty list.
+
+    #### Returns
+        Instruction: Built instruction.
+    '''
+    aux_qubits = [] if aux_qubits is None else aux_qubits
+
+    if inc:
+        (algorithm, oracle) = augment(algorithm, oracle)
+
+    aux_set = frozenset(aux_qubits)
+    qubits_search = [
+        x for x in range(algorithm.num_qubits) if not x in aux_set
+    ]
+    return __grover_iterate(algorithm, oracle, qubits_search)
+
+
 def circuit_optimal(
     algorithm: QuantumCircuit,
     oracle: QuantumOracle,
@@ -54,10 +192,10 @@ def circuit_optimal(
     assert len(aux_qubits) <= algorithm.num_qubits
 
     n = algorithm.num_qubits - len(aux_qubits)  # Search qubits only
-    inc = m > 2**(n-1)
+
     num_iters = __optimal_num_iters(n, m)
 
-    return circuit(algorithm, oracle, num_iters, inc, aux_qubits)
+    return circuit(algorithm, oracle, num_iters, False, aux_qubits)
 
 
 def circuit(
@@ -65,7 +203,9 @@ def circuit(
     oracle: QuantumOracle,
     num_iters: int,
     inc: bool = False,
-    aux_qubits: list[int] = None
+    aux_qubits: list[int] = None,
+    op: Instruction = None,
+    checkpoints: list[int] = None
 ) -> QuantumCircuit:
     '''Build a quantum circuit implementing the amplitude amplification algorithm.
 
@@ -77,10 +217,17 @@ def circuit(
             Defaults to False.
         aux_qubits (list[int]): List of indices of auxiliary qubits (e.g. used by the oracle) \
             that should not be used for the search procedure. Defaults to the empty list.
+        op (Instruction): Grover iterate, as built by `grover_iterate` with the same arguments. \
+            Defaults to building it from scratch.
+        checkpoints (list[int]): Numbers of iterations after which to save (with Aer) the \
+            outcome probabilities of the search qubits, labeled by the number of iterations \
+            performed so far, instead of measuring them at the end. Defaults to measuring.
 
     #### Returns
         QuantumCircuit: Built circuit.
     '''
+    # pylint: disable=too-many-arguments,too-many-locals
+
     aux_qubits = [] if aux_qubits is None else aux_qubits
 
     assert algorithm.num_qubits == oracle.num_qubits
@@ -94,57 +241,42 @@ def circuit(
     if inc:
         n_all += 1
         n_search += 1
+        (algorithm, oracle) = augment(algorithm, oracle)
 
-        # Algorithm
-        algorithm.name = 'AlgorithmAug'
-        aug = QuantumRegister(1, 'aug')
-        algorithm.add_register(aug)
-        algorithm.h(aug)  # Equiprobable superposition
-        assert algorithm.num_qubits == n_all
-
-        # Oracle
-        c_oracle = oracle.control()
-        c_oracle.name = 'OracleAug'
-        oracle.data = []
-        aug = QuantumRegister(1, 'aug')
-        oracle.add_register(aug)
-        oracle.compose(
-            c_oracle,
-            [n_all-1] + list(range(n_all-1)),
-            inplace=True,
-        )
-        assert oracle.num_qubits == n_all
-
-    # Copy qubit strucure of oracle
-    circ = copy.deepcopy(oracle)
-    circ.data = []
-    circ.name = 'Amp'
+    # Copy qubit strucure of oracle (registers are shared, instructions are not copied)
+    circ = QuantumCircuit(*oracle.qregs, name='Amp')
 
     # Qubit partitioning
-    qubits_search = list(filter(
-        lambda x: not x in aux_qubits,
-        list(range(n_all))
-    ))
-    qubits_measure = list(filter(
-        lambda x: not x in aux_qubits,
-        list(range(n_all - (1 if inc else 0)))
-    ))
+    aux_set = frozenset(aux_qubits)
+    qubits_search = [x for x in range(n_all) if not x in aux_set]
+    qubits_measure = [
+        x for x in range(n_all - (1 if inc else 0)) if not x in aux_set
+    ]
+
+    # Reverse order to match natural expectation
+    qubits_result = list(reversed(qubits_measure))
+    n_result = len(qubits_result)
 
     # Initialization
+    checkpoints = None if checkpoints is None else frozenset(checkpoints)
     circ.append(algorithm, circ.qubits)
+    if checkpoints is not None and 0 in checkpoints:
+        circ.append(SaveProbabilities(n_result, label='0'), qubits_result)
 
     # Iterations
-    op = GroverOperator(oracle, state_preparation=algorithm,
-                        reflection_qubits=qubits_search).decompose()
-    op.name = "Q"
-    for _ in range(num_iters):
+    if op is None and num_iters > 0:
+        op = __grover_iterate(algorithm, oracle, qubits_search)
+    for idx in range(num_iters):
         circ.append(op, circ.qubits)
+        if checkpoints is not None and idx+1 in checkpoints:
+            circ.append(SaveProbabilities(
+                n_result, label=f'{idx+1}'), qubits_result)
 
     # Measurements
-    result = ClassicalRegister(len(qubits_measure), name='result')
-    circ.add_register(result)
-    # Reverse order to match natural expectation
-    circ.measure(list(reversed(qubits_measure)), result)
+    if checkpoints is None:
+        result = ClassicalRegister(n_result, name='result')
+        circ.add_register(result)
+        circ.measure(qubits_result, result)
 
     return circ
 
@@ -153,24 +285,47 @@ def circuit(
 # | Algorithm simulation |
 # +----------------------+
 
-def __measure_to_model(measurements: str, var_names: list[str]) -> Interpretation:
+def __measure_to_model(measurements: int, var_names: list[str]) -> Interpretation:
     '''Convert the result of a measurement to a human-readable format with variable names.
 
     #### Arguments
-        measurements (str): Measured bits.
+        measurements (int): Measured bits, where the most significant one refers to the first \
+            variable.
         var_names (list[str]): Ordered list of variable names that the measurements refer to.
 
     #### Return
         Interpretation: Solution representation.
     '''
-    assert len(measurements) == len(var_names)
+    assert measurements >> len(var_names) == 0
+
+    last = len(var_names) - 1
+    return {
+        (name, bool((measurements >> (last - idx)) & 1))
+        for (idx, name) in enumerate(var_names)
+    }
+
+
+def __var_names(q_oracle: QuantumOracle, aux_qubits: list[int]) -> list[str]:
+    '''Extract the names of the variables associated to the search qubits of an oracle, i.e. \
+        the names of the (first) registers the qubits belong to.
+
+    #### Arguments
+        q_oracle (QuantumOracle): Circuit that implements the oracle.
+        aux_qubits (list[int]): List of indices of auxiliary qubits.
+
+    #### Return
+        list[str]: Ordered list of variable names.
+    '''
+    # NOTE: A single walk over the registers, instead of one `find_bit' lookup per qubit.
+    names = {}
+    for reg in q_oracle.qregs:
+        for qubit in reg:
+            names.setdefault(qubit, reg.name)
 
-    model = set()
-    for (name, value) in zip(var_names, measurements):
-        assert value in ('0', '1')
-        bool_value = value == '1'
-        model.add((name, bool_value))
-    return model
+    aux_set = frozenset(aux_qubits)
+    return [
+        names[qubit] for (idx, qubit) in enumerate(q_oracle.qubits) if not idx in aux_set
+    ]
 
 
 def exec_find_one_known_m(
@@ -190,33 +345,38 @@ def exec_find_one_known_m(
 
     #### Return
         tuple[QuantumCircuit, int, Interpretation]: Used circuit, number of iterations performed, \
-            and found solution.
+            and found solution (`None` if m = 0).
     '''
     # pylint: disable=too-many-locals
 
     aux_qubits = [] if aux_qubits is None else aux_qubits
     (c_oracle, q_oracle) = oracle
 
+    # No solution exists, hence there is nothing to search for
+    if m == 0:
+        return (circuit(algorithm, q_oracle, 0, False, aux_qubits), 0, None)
+
     # Extract variable names associated to search qubits (from oracle circuit)
-    var_names = []
-    qubits = q_oracle.qubits
-    for (idx, qubit) in zip(range(len(qubits)), qubits):
-        if not idx in aux_qubits:
-            reg = q_oracle.find_bit(qubit).registers[0][0]
-            var_names = var_names + [reg.name]
+    var_names = __var_names(q_oracle, aux_qubits)
 
     # Build circuit
     circ = circuit_optimal(algorithm, q_oracle, m, aux_qubits)
+    compiled = compile_circuit(circ, cache=True)  # Transpiled only once
 
     # Run simulation
-    model, iters = None, 0
-    while True:
-        iters += 1
-        result = exec_circuit(circ, shots=1)
-        measurements = list(result.get_counts().keys())[0]
-        model = __measure_to_model(measurements, var_names)
-        if c_oracle(model):
-            break
+    # NOTE: Attempts are batched into multi-shot jobs of exponentially growing size, which are \
+    #       much cheaper than as many single-shot jobs. Shots are then checked in order, so \
+    #       that the number of iterations is the same as if they were run one at a time.
+    model, iters, shots = None, 0, 16
+    while model is None:
+        result = exec_compiled(compiled, shots=shots, memory=True)
+        for measurements in result.data()['memory']:  # Hexadecimal
+            iters += 1
+            candidate = __measure_to_model(int(measurements, 16), var_names)
+            if c_oracle(candidate):
+                model = candidate
+                break
+        shots *= 2
 
     # Map output to readable format
     return (circ, iters, model)
@@ -238,8 +398,8 @@ def exec_find_one_unknown_m(
         c (float): Base of the exponential defining the guess for m.
 
     #### Return
-        tuple[list[QuantumCircuit], int, Interpretation]: List of used circuits, number of \
-            iterations performed, and found solution.
+        tuple[list[QuantumCircuit], int, Interpretation]: List of simulated circuits (one per \
+            batch of rounds), number of iterations performed, and found solution.
     '''
     # pylint: disable=too-many-locals
 
@@ -247,42 +407,53 @@ def exec_find_one_unknown_m(
     (c_oracle, q_oracle) = oracle
     inc = True  # Since we do not know m, we must be the most general possible
     random.seed()
+    rng = np.random.default_rng()
 
     # Extract variable names associated to search qubits (from oracle circuit)
-    var_names = []
-    qubits = q_oracle.qubits
-    for (idx, qubit) in zip(range(len(qubits)), qubits):
-        if not idx in aux_qubits:
-            reg = q_oracle.find_bit(qubit).registers[0][0]
-            var_names = var_names + [reg.name]
-
-    # Prepare circuit with no amplification iterations
-    circ_noiter = circuit(copy.deepcopy(algorithm),
-                          copy.deepcopy(q_oracle), 0, inc, aux_qubits)
-    circs = [circ_noiter]
+    var_names = __var_names(q_oracle, aux_qubits)
 
-    # Run simulation
-    model, iters = None, 0
-    while True:
-        iters += 1  # `l' in the paper
-        m = math.ceil(c**iters)
-
-        # Step 3
-        result = exec_circuit(circ_noiter, shots=1)
-        measurements = list(result.get_counts().keys())[0]
-        model = __measure_to_model(measurements, var_names)
-        if c_oracle(model):
-            break
-
-        # Steps 4-7
-        j = random.randint(1, m)
-        circ = circuit(copy.deepcopy(algorithm),
-                       copy.deepcopy(q_oracle), j, inc, aux_qubits)
-        circs.append(circ)
-        result = exec_circuit(circ, shots=1)
-        measurements = list(result.get_counts().keys())[0]
+    # Guesses for m never need to exceed sqrt(N) (also counting the `aug' qubit)
+    max_m = math.ceil(math.sqrt(2**(len(var_names) + 1)))
+
+    def attempt(p: np.ndarray) -> Interpretation:
+        measurements = int(rng.choice(len(p), p=p / p.sum()))
         model = __measure_to_model(measurements, var_names)
-        if c_oracle(model):
-            break
+        return model if c_oracle(model) else None
+
+    # Run simulation
+    # NOTE: The circuits of the rounds only differ in the number of iterations, hence the values \
+    #       of j are drawn in advance for a batch of rounds, and a single circuit (as long as the \
+    #       largest of them) saves the outcome probabilities after each needed number of \
+    #       iterations. A round with j iterations then samples from the j-th distribution, which \
+    #       is equivalent to (but much cheaper than) a single shot of the circuit with j \
+    #       iterations. Batches double in size up to a bound, so that neither the expected cost \
+    #       of the algorithm nor the memory held by the saved distributions blow up.
+    op = grover_iterate(algorithm, q_oracle, inc, aux_qubits)
+    circs = []
+    model, iters, batch_size = None, 0, 1
+    while model is None:
+        # Steps 4-5, for the whole batch
+        rounds = [
+            random.randint(1, min(math.ceil(c**l), max_m))
+            for l in range(iters + 1, iters + batch_size + 1)
+        ]
+        circs.append(circuit(algorithm, q_oracle, max(rounds), inc,
+                             aux_qubits, op, checkpoints=[0, *rounds]))
+        probs = exec_compiled(compile_circuit(circs[-1])).data()
+        p_0 = np.asarray(probs['0'], dtype=np.float64)
+
+        for j in rounds:
+            iters += 1  # `l' in the paper
+            __logger.debug('Round %d: j = %d', iters, j)
+            # Step 3
+            model = attempt(p_0)
+            if model is not None:
+                break
+            # Steps 6-7
+            model = attempt(np.asarray(probs[f'{j}'], dtype=np.float64))
+            if model is not None:
+                break
+
+        batch_size = min(2 * batch_size, MAX_ROUNDS_PER_SIMULATION)
 
     return (circs, iters, model)
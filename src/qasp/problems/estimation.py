@@ -1,21 +1,147 @@
 '''Amplitude estimation algorithms.
 '''
 
-import copy
+import functools
+import logging
 import math
+from collections import Counter
 from typing import Callable
 import intervals as interval
+import numpy as np
 from intervals import Interval
 from qiskit import ClassicalRegister, QuantumCircuit, QuantumRegister
-from qiskit.circuit.library import GroverOperator, QFT
+from qiskit.circuit import Gate
+from qiskit.circuit.library import GroverOperator, QFT, UnitaryGate
+from qiskit.quantum_info import Operator
 from ..oracle import Oracle, QuantumOracle
 from ..simul import exec_circuit
+from .amplification import augment, zero_reflection
+
+
+__logger = logging.getLogger(__name__)
+
+# Maximum number of target qubits for which the (controlled) powers of G are explicit matrices
+MAX_UNITARY_POWER_QUBITS = 8
 
 
 # +--------------------+
 # | Estimation circuit |
 # +--------------------+
 
+def __num_estimation_qubits(m: int, eps: float) -> int:
+    '''Compute the number t of estimation qubits needed to obtain m correct binary digits with \
+        probability at least 1-eps, i.e. m + ceil(log2(2 + 1/(2 eps))).
+
+    #### Arguments
+        m (int): Desired number of binary digits to be estimated.
+        eps (float): Complement of the desired success probability.
+
+    #### Return
+        int: Number of estimation qubits.
+    '''
+    # Exact ceiling of the logarithm, read from the binary exponent (x = mantissa * 2^exponent, \
+    # with 1/2 <= mantissa < 1)
+    (mantissa, exponent) = math.frexp(2 + 1/(2*eps))
+    return m + (exponent - 1 if mantissa == 0.5 else exponent)
+
+
+def __square(gate: Gate, name: str) -> Gate:
+    '''Build the square of a gate, defined as the gate applied twice (i.e. without expanding the \
+        definition of the original gate).
+
+    #### Arguments
+        gate (Gate): Gate to be squared.
+        name (str): Name of the built gate.
+
+    #### Return
+        Gate: Built gate.
+    '''
+    circ = QuantumCircuit(gate.num_qubits, name=name)
+    circ.append(gate, circ.qubits)
+    circ.append(gate, circ.qubits)
+    return circ.to_gate()
+
+
+def __controlled_iterate(
+    algorithm: QuantumCircuit,
+    oracle: QuantumOracle,
+    reflection_qubits: list[int]
+) -> Gate:
+    '''Build the controlled Grover iterate.
+
+    #### Arguments
+        algorithm (QuantumCircuit): Circuit that implements the initialization algorithm.
+        oracle (QuantumOracle): Circuit that implements the oracle.
+        reflection_qubits (list[int]): Qubits onto which the zero reflection is applied.
+
+    #### Return
+        Gate: Built gate, whose first qubit is the control one.
+    '''
+    s_0 = zero_reflection(algorithm.num_qubits, reflection_qubits)
+    c_g = GroverOperator(
+        oracle,
+        state_preparation=algorithm,
+        zero_reflection=s_0,
+        reflection_qubits=reflection_qubits,
+    ).control()
+    c_g = c_g.to_gate()
+    c_g.name = 'cQ'
+    return c_g
+
+
+def __unitary_powers(
+    algorithm: QuantumCircuit,
+    oracle: QuantumOracle,
+    reflection_qubits: list[int],
+    t: int
+) -> list[Gate]:
+    '''Build the controlled powers Q^(2^0), ..., Q^(2^(t-1)) of the Grover iterate as explicit \
+        unitaries, each computed by squaring the matrix of the previous power.
+
+    #### Arguments
+        algorithm (QuantumCircuit): Circuit that implements the initialization algorithm.
+        oracle (QuantumOracle): Circuit that implements the oracle.
+        reflection_qubits (list[int]): Qubits onto which the zero reflection is applied.
+        t (int): Number of powers to build.
+
+    #### Return
+        list[Gate]: Built gates, whose first qubit is the control one.
+    '''
+    s_0 = zero_reflection(algorithm.num_qubits, reflection_qubits)
+    pow_g = Operator(GroverOperator(
+        oracle,
+        state_preparation=algorithm,
+        zero_reflection=s_0,
+        reflection_qubits=reflection_qubits,
+    )).data
+
+    # The control qubit is the least significant one
+    (ctrl_0, ctrl_1) = (np.diag([1, 0]), np.diag([0, 1]))
+    identity = np.eye(len(pow_g))
+    c_pows_g = []
+    for idx in range(t):
+        c_pow_g = np.kron(identity, ctrl_0) + np.kron(pow_g, ctrl_1)
+        label = f'cQ^(2^{idx})'
+        c_pows_g.append(UnitaryGate(c_pow_g, label=label, check_input=False))
+        pow_g = pow_g @ pow_g
+    return c_pows_g
+
+
+@functools.lru_cache(maxsize=None)
+def __inverse_qft(t: int) -> Gate:
+    '''Build (once per size) the inverse QFT used by the estimation circuit.
+
+    #### Arguments
+        t (int): Number of qubits.
+
+    #### Return
+        Gate: Cached gate. Must not be mutated.
+    '''
+    # NOTE: Qiskit's QFT has the opposite bit order w.r.t. the one used in the thesis, hence why \
+    #       we disable the swaps.
+    return QFT(t, inverse=True, do_swaps=False).to_gate()
+
+
 def circuit(
     algorithm: QuantumCircuit,
     oracle: QuantumOracle,
@@ -44,64 +170,41 @@ def circuit(
     assert algorithm.num_qubits == oracle.num_qubits
 
     n = algorithm.num_qubits + 1  # Also counting `aug` qubit
-    t = m + math.ceil(math.log2(2 + 1/(2*eps)))
-
-    # Add `aug` qubit to algorithm
-    algorithm.name = 'AlgorithmAug'
-    aug = QuantumRegister(1, 'aug')
-    algorithm.add_register(aug)
-    algorithm.h(aug)  # Equiprobable superposition
-    assert algorithm.num_qubits == n
-
-    # Add `aug` qubit to oracle
-    c_oracle = oracle.control()
-    c_oracle.name = 'OracleAug'
-    oracle.data = []
-    aug = QuantumRegister(1, 'aug')
-    oracle.add_register(aug)
-    oracle.compose(
-        c_oracle,
-        [n-1] + list(range(n-1)),
-        inplace=True,
-    )
-    assert oracle.num_qubits == n
+    t = __num_estimation_qubits(m, eps)
+
+    # Add `aug` qubit to algorithm and oracle (without mutating them)
+    (algorithm, oracle) = augment(algorithm, oracle)
 
     # Circuit structure
-    qr0 = QuantumRegister(t)
-    qr_others = list(  # Clone qubit labels from oracle
-        dict.fromkeys(  # Remove duplicates while maintaining order
-            map(lambda q: oracle.find_bit(q).registers[0][0], oracle.qubits)
-        )
-    )
+    qr0 = QuantumRegister(t, 'est')  # Named, for reproducibility
+    qr_others = list(oracle.qregs)  # Clone qubit labels from oracle
     circ = QuantumCircuit(qr0, *qr_others)
     circ.name = 'Est'
 
     # Qubit partitioning
-    qubits_search = list(filter(
-        lambda x: not x in aux_qubits,
-        list(range(n))
-    ))
+    aux_set = frozenset(aux_qubits)
+    qubits_search = [x for x in range(n) if not x in aux_set]
 
     # Initialization
     circ.h(qr0)
     circ.append(algorithm, qr_others)
 
     # Iterations
-    pow_g = GroverOperator(
-        oracle, state_preparation=algorithm, reflection_qubits=qubits_search)
-    pow_g.name = 'Q^(2^0)'
-    for idx in range(t):
-        c_pow_g = copy.deepcopy(pow_g).control()
-        circ.compose(c_pow_g, [t-idx-1] + list(range(t, t+n)), inplace=True)
-        # Next power of G
-        pow_g.compose(pow_g, pow_g.qubits, inplace=True)
-        pow_g.name = f'Q^(2^{idx+1})'
+    qubits_target = list(range(t, t+n))
+    if n <= MAX_UNITARY_POWER_QUBITS:  # Each power of G is a single matrix
+        c_pows_g = __unitary_powers(algorithm, oracle, qubits_search, t)
+        for (idx, c_pow_g) in enumerate(c_pows_g):
+            circ.append(c_pow_g, [t-idx-1, *qubits_target])
+    else:
+        # NOTE: The powers of G are unrolled into repetitions of the same (controlled only once) \
+        #       gate, so that the circuit is a flat sequence of iterates.
+        c_g = __controlled_iterate(algorithm, oracle, qubits_search)
+        for idx in range(t):
+            for _ in range(2**idx):
+                circ.append(c_g, [t-idx-1, *qubits_target])
 
     # Inverse QFT
-    # NOTE: Qiskit's QFT has the opposite bit order w.r.t. the one used in the thesis, hence why \
-    #       we disable the swaps.
-    iqft = QFT(t, inverse=True, do_swaps=False)
-    circ.append(iqft, qr0)
+    circ.append(__inverse_qft(t), qr0)
 
     # Measurements
     result = ClassicalRegister(m, name='result')
@@ -111,22 +214,97 @@ def circuit(
     return circ
 
 
+def circuit_iterative(
+    algorithm: QuantumCircuit,
+    oracle: QuantumOracle,
+    m: int,
+    eps: float,
+    aux_qubits: list[int] = None
+) -> QuantumCircuit:
+    '''Build a quantum circuit implementing the amplitude estimation algorithm by means of \
+        iterative (i.e. semiclassical) phase estimation. The t phase bits are estimated one at a \
+        time on a single (reset) qubit, from the least to the most significant one, with \
+        classically controlled corrections replacing the inverse QFT.
+
+    #### Arguments
+        algorithm (QuantumCircuit): Ciruit that implements the initialization algorithm.
+        oracle (QuantumOracle): Citcuit that implements the oracle.
+        m (int): Desired number of binary digits to be estimated.
+        eps (float): Complement of the desired success probability.
+        aux_qubits (list[int]): List of indices of auxiliary qubits (e.g. used by the oracle) \
+            that should not be used for the search procedure. Defaults to the empty list.
+
+    #### Return
+        QuantumCircuit: Built circuit. Its outcome has t bits, the first m of which are the same \
+            as the ones measured by `circuit`.
+    '''
+    # pylint: disable=too-many-locals
+
+    aux_qubits = [] if aux_qubits is None else aux_qubits
+
+    assert m > 0 and eps > 0
+    assert algorithm.num_qubits == oracle.num_qubits
+
+    n = algorithm.num_qubits + 1  # Also counting `aug` qubit
+    t = __num_estimation_qubits(m, eps)
+
+    # Add `aug` qubit to algorithm and oracle
+    (algorithm, oracle) = augment(algorithm, oracle)
+
+    # Circuit structure
+    qr0 = QuantumRegister(1, 'est')
+    bits = ClassicalRegister(t, name='result')
+    circ = QuantumCircuit(qr0, *oracle.qregs, bits, name='EstIter')
+    qubits_others = list(range(1, n+1))
+
+    # Qubit partitioning
+    aux_set = frozenset(aux_qubits)
+    qubits_search = [x for x in range(n) if not x in aux_set]
+
+    # Initialization
+    circ.append(algorithm, qubits_others)
+
+    # Controlled powers of G, each defined as the square of the previous one
+    if n <= MAX_UNITARY_POWER_QUBITS:  # Each power of G is a single matrix
+        c_pows_g = __unitary_powers(algorithm, oracle, qubits_search, t)
+    else:
+        # NOTE: The iterate is controlled only once, since controlling each power separately \
+        #       would require to control (an unrolled version of) its whole definition.
+        c_pows_g = [__controlled_iterate(algorithm, oracle, qubits_search)]
+        for idx in range(1, t):
+            c_pows_g.append(__square(c_pows_g[-1], f'cQ^(2^{idx})'))
+
+    # Iterations
+    # NOTE: Phase bit `k' (i.e. the `k'-th digit of the binary fraction) is stored in classical \
+    #       bit `t-k', so that the outcome reads as in `circuit'.
+    for k in range(t, 0, -1):
+        circ.reset(qr0)
+        circ.h(qr0)
+        circ.append(c_pows_g[k-1], [0] + qubits_others)
+        for j in range(k+1, t+1):  # Remove contribution of the already estimated bits
+            circ.p(-2 * math.pi / 2**(j-k+1), qr0).c_if(bits[t-j], 1)
+        circ.h(qr0)
+        circ.measure(qr0, bits[t-k])
+
+    return circ
+
+
 # +-----------------------+
 # | Algoroithm simulation |
 # +-----------------------+
 
-def __phase_to_count(n: int, phase: float) -> float:
-    '''Compute the number M of solutions of a search problem given an estimate of the rotation \
+def __phase_to_count(n: int, phases: np.ndarray) -> np.ndarray:
+    '''Compute the number M of solutions of a search problem given estimates of the rotation \
         angle phi of the respective Grover Operator.
 
     #### Arguments
         N (int): Number of search qubits.
-        phase (float): Estimate value of the phase phi.
+        phases (np.ndarray): Estimate values of the phase phi.
 
     #### Return
-        float: Estimated value of M.
+        np.ndarray: Estimated values of M, one for each phase.
     '''
-    return 2**n * math.sin(phase/2)**2
+    return 2**n * np.sin(phases/2)**2
 
 
 def __measure_to_count(
@@ -147,14 +325,8 @@ def __measure_to_count(
         tuple[Interval, Interval]: Estimation intervals for the measured phase and the solutions \
             count, respectively.
     '''
-    count_fn = (
-        lambda phase: __phase_to_count(num_search_qubits, phase)
-    ) if count_fn is None else count_fn
-
     m = len(measurements)
-    phi = 0.0
-    for (idx, bit) in zip(range(m), measurements):
-        phi += int(bit) * 2**(-idx-1)
+    phi = int(measurements, 2) / (1 << m)  # 0.b_1 b_2 ... b_m
     phases = [2 * math.pi * (phi + delta) for delta in [0, 2**(-m)]]
 
     if phi <= 1/2:  # If theta was measured
@@ -164,7 +336,10 @@ def __measure_to_count(
         phases = [2 * math.pi - phase for phase in reversed(phases)]
 
     phase_estimate = interval_type(phases[0], phases[1])
-    counts = [count_fn(phase) for phase in phases]
+    if count_fn is None:  # Both bounds at once
+        counts = __phase_to_count(num_search_qubits, np.array(phases)).tolist()
+    else:
+        counts = [count_fn(phase) for phase in phases]
     count_estimate = interval_type(counts[0], counts[1])
 
     return (phase_estimate, count_estimate)
@@ -176,7 +351,9 @@ def exec_count(
     m: int,
     eps: float,
     aux_qubits: list[int] = None,
-    count_fn: Callable[[float], float] = None
+    count_fn: Callable[[float], float] = None,
+    iterative: bool = False,
+    shots: int = 1
 ) -> tuple[QuantumCircuit, Interval, Interval]:
     '''Simulate the amplitude estimation circuit to approximate the number of solutions of the \
         problem.
@@ -190,12 +367,16 @@ def exec_count(
             that should not be used for the search procedure. Defaults to the empty list.
         count_fn (Callable[[float], float]): Function that, given an estimate for phi, computes \
             the solutions count (or any other needed value). Defaults to N * sin^2(theta/2).
+        iterative (bool): Whether to use iterative phase estimation (see `circuit_iterative`), \
+            which needs t-1 less qubits. Defaults to False.
+        shots (int): Number of experiment repetitions to simulate, the most frequent outcome of \
+            which is used for the estimate. Defaults to 1.
 
     #### Return
         tuple[QuantumCircuit, Interval, Interval]: Used circuit, estimation interval for the \
             measured phase, and estimation interval for the solutions count.
     '''
-    # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-arguments,too-many-locals
 
     aux_qubits = [] if aux_qubits is None else aux_qubits
     (_, q_oracle) = oracle  # Classical oracle is unused
@@ -203,11 +384,18 @@ def exec_count(
     n = len(q_oracle.qubits) - len(aux_qubits) + 1  # Account for `aug`
 
     # Build circuit
-    circ = circuit(algorithm, q_oracle, m, eps, aux_qubits)
+    build = circuit_iterative if iterative else circuit
+    circ = build(algorithm, q_oracle, m, eps, aux_qubits)
 
     # Run simulation and compute results
-    result = exec_circuit(circ, shots=1)
-    measurements = list(result.get_counts().keys())[0]
+    # NOTE: The measurements of `circuit' are all at the end, hence Aer samples all the shots \
+    #       from a single simulation. The mode is taken over the first m bits only.
+    result = exec_circuit(circ, shots=shots, cache=True)
+    votes = Counter()
+    for (outcome, times) in result.get_counts().items():
+        votes[outcome[:m]] += times
+    measurements = votes.most_common(1)[0][0]
     (phase, count) = __measure_to_count(measurements, n, count_fn)
+    __logger.debug('Measured %s (count: %s)', measurements, count)
 
     return (circ, phase, count)
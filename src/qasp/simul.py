@@ -1,51 +1,355 @@
 '''Utility functions for simulating quantum circuits.
 '''
 
-from qiskit import QuantumCircuit, transpile
-from qiskit.synthesis import generate_basic_approximations
-from qiskit.transpiler.passes.synthesis import SolovayKitaev
-from qiskit_aer import Aer, AerJob
+import functools
+import hashlib
+import os
+import warnings
+import numpy as np
+import qiskit
+import qiskit_aer
+from qiskit import QuantumCircuit, qpy, transpile
+from qiskit.circuit import ControlFlowOp
+from qiskit_aer import AerError, AerJob, AerSimulator
+from qiskit_aer.library import SetStatevector
 
 
-def exec_circuit(circ: QuantumCircuit, shots: int = 1) -> AerJob:
-    '''Execute a quantum circuit and retrieve the execution result.
+# Minimum circuit width for which the GPU (if available) is preferred over the CPU
+GPU_MIN_QUBITS = 20
+# Maximum circuit width for which the initial superposition is set as an explicit statevector
+MAX_STATEVECTOR_INIT_QUBITS = 20
+
+
+# +------------+
+# | Simulators |
+# +------------+
+
+@functools.lru_cache(maxsize=None)
+def __statevector_simulator(device: str) -> AerSimulator:
+    '''Return the (shared) statevector simulator running on the given device.
+
+    #### Arguments
+        device (str): Either `CPU` or `GPU`.
+
+    #### Return
+        AerSimulator: Simulator instance.
+    '''
+    # NOTE: cuStateVec (if Aer was built with it) fuses gates and speeds up GPU simulation, while \
+    #       batching runs the shots that cannot be sampled (e.g. with mid-circuit measurements) \
+    #       in parallel.
+    options = {
+        'cuStateVec_enable': True,
+        'batched_shots_gpu': True,
+    } if device == 'GPU' else {}
+    return AerSimulator(method='statevector', device=device, **options)
+
+
+def __simulation_device(circ: QuantumCircuit) -> str:
+    '''Choose the device to simulate a circuit on. The choice can be forced by setting the \
+        `QASP_SIM_DEVICE` environment variable to either `CPU` or `GPU`.
 
     #### Arguments
         circ (QuantumCircuit): Circuit to simulate.
+
+    #### Return
+        str: Either `CPU` or `GPU`.
+    '''
+    device = os.environ.get('QASP_SIM_DEVICE')
+    if device is not None:
+        return device.upper()
+    has_gpu = 'GPU' in __statevector_simulator('CPU').available_devices()
+    return 'GPU' if has_gpu and circ.num_qubits >= GPU_MIN_QUBITS else 'CPU'
+
+
+# +---------------------+
+# | Aer-specific passes |
+# +---------------------+
+
+def __absorb_initial_superposition(circ: QuantumCircuit) -> QuantumCircuit:
+    '''Replace the Hadamard gates acting first on their qubits (e.g. those of the Walsh-Hadamard \
+        initialization) with a single instruction directly setting the resulting statevector.
+
+    #### Arguments
+        circ (QuantumCircuit): Transpiled circuit.
+
+    #### Return
+        QuantumCircuit: Equivalent circuit (or the same one, if there is nothing to absorb).
+    '''
+    if circ.num_qubits > MAX_STATEVECTOR_INIT_QUBITS:
+        return circ  # The explicit statevector would be too large
+
+    # NOTE: Conditioned gates (and control flow operations) only touch their qubits, since \
+    #       whether they are applied is only known at runtime.
+    touched, superposed, kept = set(), set(), []
+    for instr in circ.data:
+        op = instr.operation
+        unconditioned = getattr(op, 'condition', None) is None \
+            and not isinstance(op, ControlFlowOp)
+        if op.name == 'h' and unconditioned and not instr.qubits[0] in touched:
+            superposed.add(instr.qubits[0])
+        else:
+            kept.append(instr)
+        touched.update(instr.qubits)
+    if not superposed:
+        return circ
+
+    # Product state: |+> on superposed qubits, |0> on the others (qubit 0 is the rightmost)
+    state = np.ones(1, dtype=complex)
+    plus = np.full(2, 1 / np.sqrt(2), dtype=complex)
+    zero = np.array([1, 0], dtype=complex)
+    for qubit in circ.qubits:
+        state = np.kron(plus if qubit in superposed else zero, state)
+
+    absorbed = circ.copy_empty_like()
+    absorbed.append(SetStatevector(state), absorbed.qubits)
+    for instr in kept:
+        absorbed.append(instr)
+    return absorbed
+
+
+# +------------+
+# | Simulation |
+# +------------+
+
+def __fingerprint(
+    circ: QuantumCircuit,
+    basis: frozenset[str],
+    memo: dict[int, bytes]
+) -> bytes:
+    '''Compute a digest of a quantum circuit that only depends on its content, i.e. on its \
+        registers and instructions (recursively expanding the definitions of those that are not \
+        in the basis).
+
+    #### Arguments
+        circ (QuantumCircuit): Circuit to digest.
+        basis (frozenset[str]): Names of the instructions whose definition is not expanded.
+        memo (dict[int, bytes]): Digests of the already visited instructions, by identity.
+
+    #### Return
+        bytes: Computed digest.
+    '''
+    # NOTE: QPY serializations cannot be used for this purpose, since they tag custom gates with \
+    #       random identifiers.
+    # Registers are part of the content, since they determine the format of the results
+    header = (
+        circ.num_qubits,
+        circ.num_clbits,
+        float(circ.global_phase),
+        [(reg.name, reg.size) for reg in circ.qregs],
+        [(reg.name, reg.size) for reg in circ.cregs],
+    )
+    digest = hashlib.sha256(repr(header).encode())
+    for instr in circ.data:
+        op = instr.operation
+        if not id(op) in memo:
+            op_digest = hashlib.sha256(op.name.encode())
+            for param in map(np.asarray, op.params):
+                numeric = param.dtype != object
+                op_digest.update(
+                    param.tobytes() if numeric else repr(param).encode())
+            if not op.name in basis and op.definition is not None:
+                op_digest.update(__fingerprint(op.definition, basis, memo))
+            memo[id(op)] = op_digest.digest()
+        digest.update(memo[id(op)])
+        digest.update(repr((
+            [circ.find_bit(qubit).index for qubit in instr.qubits],
+            [circ.find_bit(clbit).index for clbit in instr.clbits],
+            getattr(op, 'condition', None),
+        )).encode())
+    return digest.digest()
+
+
+def __transpile(circ: QuantumCircuit, simulator: AerSimulator) -> QuantumCircuit:
+    '''Transpile a quantum circuit for the simulator, only translating it into the basis gates.
+
+    #### Arguments
+        circ (QuantumCircuit): Circuit to transpile.
+        simulator (AerSimulator): Target simulator.
+
+    #### Return
+        QuantumCircuit: Circuit transpiled for the simulator.
+    '''
+    # NOTE: The simulator has no coupling map (hence no layout is needed) and fuses gates on its \
+    #       own, hence optimization passes would only add to the compilation time.
+    return transpile(
+        circ,
+        basis_gates=simulator.configuration().basis_gates,
+        coupling_map=None,
+        optimization_level=0,
+    )
+
+
+def __transpile_cached(circ: QuantumCircuit, simulator: AerSimulator) -> QuantumCircuit:
+    '''Transpile a quantum circuit for the simulator, reusing the result stored by previous runs \
+        in the directory given by the `QASP_CACHE_DIR` environment variable (if set).
+
+    #### Arguments
+        circ (QuantumCircuit): Circuit to transpile. Must only contain instructions that can be \
+            serialized to QPY (i.e. no Aer-specific ones).
+        simulator (AerSimulator): Target simulator.
+
+    #### Return
+        QuantumCircuit: Circuit transpiled for the simulator.
+    '''
+    cache_dir = os.environ.get('QASP_CACHE_DIR')
+    if cache_dir is None:
+        return __transpile(circ, simulator)
+
+    # The key also accounts for the target, which the transpilation result depends on
+    basis = frozenset(simulator.configuration().basis_gates)
+    key = hashlib.sha256(__fingerprint(circ, basis, {}))
+    key.update(repr((
+        qiskit.__version__,
+        qiskit_aer.__version__,
+        sorted(basis),
+    )).encode())
+    path = os.path.join(cache_dir, f'{key.hexdigest()}.qpy')
+
+    if os.path.isfile(path):
+        with open(path, 'rb') as file:
+            return qpy.load(file)[0]
+
+    transpiled = __transpile(circ, simulator)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'  # Never expose partial files
+    with open(tmp_path, 'wb') as file:
+        qpy.dump(transpiled, file)
+    os.replace(tmp_path, path)
+    return transpiled
+
+
+def __run(circs: QuantumCircuit | list[QuantumCircuit], device: str, **options) -> AerJob:
+    '''Run already compiled quantum circuits on the given device, falling back to the CPU if \
+        the GPU fails.
+
+    #### Arguments
+        circs (QuantumCircuit | list[QuantumCircuit]): Circuit(s) to simulate.
+        device (str): Either `CPU` or `GPU`.
+        options: Run options for the simulator.
+
+    #### Return
+        AerJob: Result of the simulation.
+    '''
+    try:
+        result = __statevector_simulator(device).run(circs, **options).result()
+    except (AerError, RuntimeError):
+        if device == 'CPU':
+            raise
+        result = None
+
+    # NOTE: Some failures (e.g. running out of memory) are not raised by Aer, but only reported \
+    #       by the status of the result.
+    if result is not None and result.success:
+        return result
+    if device == 'CPU':
+        raise AerError(f'Simulation failed: {result.status}')
+    # Fall back to the CPU (e.g. GPU out of memory, or Aer built without cuStateVec)
+    return __run(circs, 'CPU', **options)
+
+
+def __compile_circuit(circ: QuantumCircuit, cache: bool, stacklevel: int) -> QuantumCircuit:
+    '''Transpile a quantum circuit for the simulator (see `compile_circuit`).
+
+    #### Arguments
+        circ (QuantumCircuit): Circuit to compile.
+        cache (bool): Whether to use the on-disk cache of transpiled circuits.
+        stacklevel (int): Stack level (w.r.t. this function) of the user code that submitted the \
+            circuit, to which warnings are attributed.
+
+    #### Return
+        QuantumCircuit: Circuit transpiled for the simulator.
+    '''
+    # Decomposing into Clifford+T only inflates the gate count, which Aer pays for in full
+    ops = set(circ.count_ops()) - {'barrier', 'measure', 'reset'}
+    if ops & {'t', 'tdg'} and ops <= {'h', 's', 'sdg', 't', 'tdg', 'cx'}:
+        warnings.warn(
+            'Simulating a circuit in the Clifford+T basis, which is much slower than simulating '
+            'the original one (see `decompose.transpile_into_clifford_t_basis`).',
+            stacklevel=stacklevel,
+        )
+
+    simulator = __statevector_simulator('CPU')  # Same target on every device
+    # Circuits only made of natively supported instructions need no transpilation at all
+    if not ops <= set(simulator.configuration().basis_gates):
+        transpile_fn = __transpile_cached if cache else __transpile
+        circ = transpile_fn(circ, simulator)
+    return __absorb_initial_superposition(circ)
+
+
+def compile_circuit(circ: QuantumCircuit, cache: bool = False) -> QuantumCircuit:
+    '''Transpile a quantum circuit for the simulator, so that it can be executed multiple times.
+
+    #### Arguments
+        circ (QuantumCircuit): Circuit to compile.
+        cache (bool): Whether to use the on-disk cache of transpiled circuits (see \
+            `QASP_CACHE_DIR`). Only allowed for circuits without Aer-specific instructions. \
+            Defaults to False.
+
+    #### Return
+        QuantumCircuit: Circuit transpiled for the simulator.
+    '''
+    return __compile_circuit(circ, cache, stacklevel=3)  # Caller of this function
+
+
+def exec_compiled(circ: QuantumCircuit, shots: int = 1, memory: bool = False) -> AerJob:
+    '''Execute an already compiled quantum circuit and retrieve the execution result.
+
+    #### Arguments
+        circ (QuantumCircuit): Circuit to simulate, as returned by `compile_circuit`.
         shots (int): Number of experiment repetitions to simulate. Defaults to 1.
+        memory (bool): Whether to also store the outcome of each individual shot (in order). \
+            Defaults to False.
 
     #### Return
         AerJob: Result of the simulation.
     '''
-    simulator = Aer.get_backend('aer_simulator')
-    circ = transpile(circ, simulator)
-    result = simulator.run(circ, shots=shots).result()
-    return result
+    return __run(circ, __simulation_device(circ), shots=shots, memory=memory)
 
 
-def transpile_into_clifford_t_basis(
-    circ: QuantumCircuit,
-    approx_depth: int = 3,
-    sk_rec: int = 2,
-    opt_lv: int = 3,
-) -> QuantumCircuit:
-    '''Transpile and decompose a given circuit into the Clifford+T basis.
-
-    #### Arguments
-        circ (QuantumCircuit): Quantum circuit to be transpiled.
-        approx_depth (int): Gates approximation depth. Defaults to 3.
-        sk_rec (int): Recursion degree for the Solovay-Kitaev decomposition algorithm. Defaults to
-            2.
-        opt_lv (int): Optimization level for the transpiling process. Defaults to 3.
-
-    #### Return
-        QuantumCircuit: Transpiled circuit.
-    '''
-    universal_basis = ['u1', 'u2', 'u3', 'cx']
-    clifford_t_basis = ['h', 's', 't']
-    basis = generate_basic_approximations(clifford_t_basis, depth=approx_depth)
-    skd = SolovayKitaev(recursion_degree=sk_rec, basic_approximations=basis)
-    transpiled = transpile(
-        circ, basis_gates=universal_basis, optimization_level=opt_lv)
-    decomposed = skd(transpiled)
-    return decomposed
+def exec_circuits(
+    circs: list[QuantumCircuit],
+    shots: int = 1,
+    cache: bool = False
+) -> AerJob:
+    '''Execute multiple quantum circuits as a single batch, simulated in parallel, and retrieve \
+        the execution result.
+
+    #### Arguments
+        circs (list[QuantumCircuit]): Circuits to simulate.
+        shots (int): Number of experiment repetitions to simulate (for each circuit). Defaults \
+            to 1.
+        cache (bool): Whether to use the on-disk cache of transpiled circuits (see \
+            `compile_circuit`). Defaults to False.
+
+    #### Return
+        AerJob: Result of the simulations, where the i-th experiment refers to the i-th circuit \
+            (`None` if no circuits are given).
+    '''
+    if not circs:
+        return None  # Nothing to simulate
+
+    compiled = []
+    for circ in circs:  # Not a comprehension, which would be one more stack frame
+        compiled.append(__compile_circuit(circ, cache, stacklevel=3))
+    # All circuits run on the device chosen for the widest one
+    widest = max(compiled, key=lambda circ: circ.num_qubits)
+    device = __simulation_device(widest)
+    # NOTE: Zero parallel experiments means as many as the available CPU cores.
+    return __run(compiled, device, shots=shots, max_parallel_experiments=0)
+
+
+def exec_circuit(circ: QuantumCircuit, shots: int = 1, cache: bool = False) -> AerJob:
+    '''Execute a quantum circuit and retrieve the execution result.
+
+    #### Arguments
+        circ (QuantumCircuit): Circuit to simulate.
+        shots (int): Number of experiment repetitions to simulate. Defaults to 1.
+        cache (bool): Whether to use the on-disk cache of transpiled circuits (see \
+            `compile_circuit`). Defaults to False.
+
+    #### Return
+        AerJob: Result of the simulation.
+    '''
+    # Warnings are attributed to the caller of this function
+    compiled = __compile_circuit(circ, cache, stacklevel=3)
+    return exec_compiled(compiled, shots)